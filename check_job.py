@@ -21,11 +21,101 @@ that, the size will be rounded to the two most significant digits.
 """
 
 import argparse
+import functools
+import re
+import time
+
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 
 CONFIG_PATH = './googleads_config.yaml'
 
+# Polling
+POLL_MIN_INTERVAL_SECONDS = 5
+POLL_MAX_INTERVAL_SECONDS = 300
+POLL_TIMEOUT_SECONDS = 5 * 60 * 60
+
+# Queries
+JOB_STATUS_QUERY = '''
+        SELECT
+          offline_user_data_job.resource_name,
+          offline_user_data_job.id,
+          offline_user_data_job.status,
+          offline_user_data_job.type,
+          offline_user_data_job.failure_reason
+        FROM offline_user_data_job
+        WHERE offline_user_data_job.resource_name =
+          '{resource_name}'
+        LIMIT 1'''
+USER_LIST_INFO_QUERY = '''
+      SELECT
+        user_list.size_for_display,
+        user_list.size_for_search
+      FROM user_list
+      WHERE user_list.resource_name = '{resource_name}'
+  '''
+JOB_RESOURCE_NAME_PATTERN = re.compile(r'customers/\d+/offlineUserDataJobs/\d+')
+USER_LIST_RESOURCE_NAME_PATTERN = re.compile(r'customers/\d+/userLists/\d+')
+
+
+@functools.lru_cache(maxsize=None)
+def build_query(template, pattern, resource_name):
+  """Fills a query template with a resource name, after validating it.
+
+  The queries are cached, so polling a job reuses the same query text.
+
+  Args:
+    template: The query template, with a {resource_name} placeholder.
+    pattern: The compiled regular expression the resource name must match.
+    resource_name: The resource name to filter the query by.
+
+  Returns:
+    The query.
+
+  Raises:
+    ValueError: If the resource name doesn't match the pattern.
+  """
+  if not pattern.fullmatch(resource_name):
+    raise ValueError(f'Invalid resource name: \'{resource_name}\'')
+  return template.format(resource_name=resource_name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_service(client, name):
+  """Gets a service client, creating it only on the first call.
+
+  Each new service client opens its own gRPC channel, so a single instance is
+  shared by all the queries.
+
+  Args:
+    client: The Google Ads client instance.
+    name: The name of the service, e.g. 'GoogleAdsService'.
+
+  Returns:
+    The service client.
+  """
+  return client.get_service(name)
+
+
+def get_enum_name(client, enum_name, value):
+  """Gets the name of an enum value, with or without proto-plus messages.
+
+  Without proto-plus (use_proto_plus: False), enum fields are plain ints, so
+  the name is resolved from the enum type of the installed API version.
+
+  Args:
+    client: The Google Ads client instance.
+    enum_name: The name of the enum, e.g. 'OfflineUserDataJobStatus'.
+    value: The enum value, as read from a message field.
+
+  Returns:
+    The name of the enum value.
+  """
+  enum_type = getattr(client.get_type(f'{enum_name}Enum'), enum_name)
+  if hasattr(enum_type, 'Name'):
+    return enum_type.Name(value)
+  return enum_type(value).name
+
 
 def check_job_status(
     client,
@@ -42,27 +132,26 @@ def check_job_status(
         user data job to get the status of.
     user_list_resource_name: The resource name of the customer match user
         list
+
+  Returns:
+    The status name of the job.
   """
-  query = f'''
-        SELECT
-          offline_user_data_job.resource_name,
-          offline_user_data_job.id,
-          offline_user_data_job.status,
-          offline_user_data_job.type,
-          offline_user_data_job.failure_reason
-        FROM offline_user_data_job
-        WHERE offline_user_data_job.resource_name =
-          '{offline_user_data_job_resource_name}'
-        LIMIT 1'''
+  query = build_query(JOB_STATUS_QUERY, JOB_RESOURCE_NAME_PATTERN,
+                      offline_user_data_job_resource_name)
 
   # Issues a search request using streaming.
-  google_ads_service = client.get_service('GoogleAdsService')
-  results = google_ads_service.search(customer_id=customer_id, query=query)
-  offline_user_data_job = next(iter(results)).offline_user_data_job
-  status_name = offline_user_data_job.status.name
+  google_ads_service = get_service(client, 'GoogleAdsService')
+  stream = google_ads_service.search_stream(
+      customer_id=customer_id, query=query)
+  offline_user_data_job = next(
+      row for batch in stream for row in batch.results).offline_user_data_job
+  status_name = get_enum_name(client, 'OfflineUserDataJobStatus',
+                              offline_user_data_job.status)
+  type_name = get_enum_name(client, 'OfflineUserDataJobType',
+                            offline_user_data_job.type_)
 
   print(f'Offline user data job ID \'{offline_user_data_job.id}\' with type '
-        f'\'{offline_user_data_job.type_.name}\' has status: {status_name}')
+        f'\'{type_name}\' has status: {status_name}')
 
   if status_name == 'SUCCESS':
     print_customer_match_user_list_info(client, customer_id,
@@ -72,6 +161,50 @@ def check_job_status(
   elif status_name in ('PENDING', 'RUNNING'):
     print('The job is still runnning.')
 
+  return status_name
+
+
+def poll_until_done(
+    client,
+    customer_id,
+    offline_user_data_job_resource_name,
+    user_list_resource_name,
+):
+  """Checks the status of the offline user data job until it finishes.
+
+  The job is polled with exponential backoff, starting at
+  POLL_MIN_INTERVAL_SECONDS and doubling up to POLL_MAX_INTERVAL_SECONDS, so
+  long-running jobs don't waste API quota. Polling stops after
+  POLL_TIMEOUT_SECONDS.
+
+  Args:
+    client: The Google Ads client.
+    customer_id: The customer ID for which to add the user list.
+    offline_user_data_job_resource_name: The resource name of the offline
+        user data job to get the status of.
+    user_list_resource_name: The resource name of the customer match user
+        list
+
+  Returns:
+    The last status name of the job.
+  """
+  deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+  interval = 0
+  while True:
+    status_name = check_job_status(client, customer_id,
+                                   offline_user_data_job_resource_name,
+                                   user_list_resource_name)
+    if status_name not in ('PENDING', 'RUNNING'):
+      return status_name
+
+    interval = min(max(interval * 2, POLL_MIN_INTERVAL_SECONDS),
+                   POLL_MAX_INTERVAL_SECONDS)
+    if time.monotonic() + interval > deadline:
+      print('Stopped waiting for the job, check its status again later.')
+      return status_name
+    print(f'Checking the job status again in {interval} seconds.')
+    time.sleep(interval)
+
 
 def print_customer_match_user_list_info(client, customer_id,
                                         user_list_resource_name):
@@ -83,23 +216,17 @@ def print_customer_match_user_list_info(client, customer_id,
       user_list_resource_name: The resource name of the user list to which to
           add users.
   """
-  googleads_service_client = client.get_service('GoogleAdsService')
-
   # Creates a query that retrieves the user list.
-  query = f'''
-      SELECT
-        user_list.size_for_display,
-        user_list.size_for_search
-      FROM user_list
-      WHERE user_list.resource_name = '{user_list_resource_name}'
-  '''
+  query = build_query(USER_LIST_INFO_QUERY, USER_LIST_RESOURCE_NAME_PATTERN,
+                      user_list_resource_name)
 
-  # Issues a search request.
-  search_results = googleads_service_client.search(
+  # Issues a search request using streaming.
+  google_ads_service = get_service(client, 'GoogleAdsService')
+  stream = google_ads_service.search_stream(
       customer_id=customer_id, query=query)
 
   # Prints out some information about the user list.
-  user_list = next(iter(search_results)).user_list
+  user_list = next(row for batch in stream for row in batch.results).user_list
   print('The estimated number of users that the user list '
         f'\'{user_list.resource_name}\' has is '
         f'{user_list.size_for_display} for Display and '
@@ -127,13 +254,24 @@ if __name__ == '__main__':
       '--user_list_resource_name',
       required=True,
       help='User list resource name.')
+  parser.add_argument(
+      '--wait',
+      action='store_true',
+      default=False,
+      help='Poll the job status until the job finishes.')
   args = parser.parse_args()
 
   google_ads_client = GoogleAdsClient.load_from_storage(args.config_file)
 
   try:
-    check_job_status(google_ads_client, args.customer_id,
-                     args.job_resource_name, args.user_list_resource_name)
+    if args.wait:
+      poll_until_done(google_ads_client, args.customer_id,
+                      args.job_resource_name, args.user_list_resource_name)
+    else:
+      check_job_status(google_ads_client, args.customer_id,
+                       args.job_resource_name, args.user_list_resource_name)
+  except ValueError as ex:
+    print(ex)
   except GoogleAdsException as ex:
     print(f'Request with ID "{ex.request_id}" failed with status '
           f'"{ex.error.code().name}" and includes the following errors:')
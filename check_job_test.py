@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for check_job."""
+
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+import check_job
+
+JOB_RESOURCE_NAME = 'customers/1/offlineUserDataJobs/2'
+USER_LIST_RESOURCE_NAME = 'customers/1/userLists/3'
+
+
+class BuildQueryTest(unittest.TestCase):
+
+  def test_fills_the_resource_name(self):
+    query = check_job.build_query(check_job.JOB_STATUS_QUERY,
+                                  check_job.JOB_RESOURCE_NAME_PATTERN,
+                                  JOB_RESOURCE_NAME)
+    self.assertIn(f"'{JOB_RESOURCE_NAME}'", query)
+
+  def test_rejects_invalid_resource_names(self):
+    with self.assertRaises(ValueError):
+      check_job.build_query(check_job.JOB_STATUS_QUERY,
+                            check_job.JOB_RESOURCE_NAME_PATTERN,
+                            f"{JOB_RESOURCE_NAME}' OR '1' = '1")
+
+
+class PollUntilDoneTest(unittest.TestCase):
+
+  def poll(self, statuses):
+    """Polls a job with the given statuses, returning the sleep intervals."""
+    sleeps = []
+    with mock.patch.object(check_job, 'check_job_status',
+                           side_effect=statuses), \
+        mock.patch.object(check_job.time, 'monotonic', return_value=0), \
+        mock.patch.object(check_job.time, 'sleep', side_effect=sleeps.append), \
+        contextlib.redirect_stdout(io.StringIO()):
+      status_name = check_job.poll_until_done(None, '1', JOB_RESOURCE_NAME,
+                                              USER_LIST_RESOURCE_NAME)
+    return status_name, sleeps
+
+  def test_backs_off_exponentially_up_to_the_maximum(self):
+    status_name, sleeps = self.poll(['PENDING'] + ['RUNNING'] * 7 +
+                                    ['SUCCESS'])
+    self.assertEqual(status_name, 'SUCCESS')
+    self.assertEqual(sleeps, [5, 10, 20, 40, 80, 160, 300, 300])
+
+  def test_returns_the_first_final_status(self):
+    status_name, sleeps = self.poll(['FAILED'])
+    self.assertEqual(status_name, 'FAILED')
+    self.assertEqual(sleeps, [])
+
+  def test_stops_at_the_timeout(self):
+    with mock.patch.object(check_job, 'POLL_TIMEOUT_SECONDS', 15):
+      status_name, sleeps = self.poll(['RUNNING'] * 3)
+    self.assertEqual(status_name, 'RUNNING')
+    self.assertEqual(sleeps, [5, 10])
+
+
+if __name__ == '__main__':
+  unittest.main()
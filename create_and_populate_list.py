@@ -21,17 +21,29 @@ that, the size will be rounded to the two most significant digits.
 """
 
 import argparse
+import collections
+import concurrent.futures
 import csv
+import functools
 import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
-from google.ads.googleads.v10.enums.types import customer_match_upload_key_type
-from google.ads.googleads.v10.enums.types import offline_user_data_job_status
-from google.ads.googleads.v10.enums.types import offline_user_data_job_type
+from google.api_core.exceptions import DeadlineExceeded
+from google.api_core.exceptions import GoogleAPICallError
+from google.api_core.exceptions import ServiceUnavailable
+from google.protobuf.message import DecodeError
+import grpc
 
 # CSV Headers (Change if needed)
-HEADER_LINE = True
 EMAIL = 'Email'
 PHONE = 'Phone'
 MOBILE_ID = 'MobileId'
@@ -47,16 +59,82 @@ GENERIC_LIST = 'Generic List from the API'
 CSV_FILE_PATH = 'audience.csv'
 CONFIG_PATH = './googleads_config.yaml'
 MEMBERSHIP_LIFESPAN_DAYS = 8
+LIST_CACHE_PATH = '~/.cache/customer_match/list_ids.json'
+LIST_CACHE_MAX_AGE_DAYS = 7
 
 # Constants
 CONTACT_INFO = 'CONTACT_INFO'
 MOBILE_ADVERTISING_ID = 'MOBILE_ADVERTISING_ID'
 CRM_ID = 'CRM_ID'
 
+# Reading and hashing
+READ_AHEAD_BATCHES = 16
+SERIAL_HASHING_MAX_IDENTIFIERS = 10000
+HASHED_COLUMNS = ('emails', 'phones', 'first_names', 'last_names')
+DEDUPLICATION_KEY_BYTES = 16
+
+# Uploads
+OPERATIONS_PER_REQUEST = 10000
+MAX_UPLOAD_WORKERS = 4
+UPLOAD_MAX_ATTEMPTS = 5
+UPLOAD_RETRY_MIN_INTERVAL_SECONDS = 1
+UPLOAD_RETRY_MAX_INTERVAL_SECONDS = 60
+# (error enum, error name) pairs of the API errors worth retrying.
+RETRYABLE_ERRORS = frozenset((
+    ('DatabaseError', 'CONCURRENT_MODIFICATION'),
+    ('QuotaError', 'RESOURCE_EXHAUSTED'),
+    ('QuotaError', 'RESOURCE_TEMPORARILY_EXHAUSTED'),
+    ('InternalError', 'INTERNAL_ERROR'),
+    ('InternalError', 'TRANSIENT_ERROR'),
+    ('InternalError', 'DEADLINE_EXCEEDED'),
+))
+RETRYABLE_STATUS_CODES = (grpc.StatusCode.UNAVAILABLE,
+                          grpc.StatusCode.DEADLINE_EXCEEDED)
+# Errors of a failed request, which only make its list fail.
+REQUEST_ERRORS = (GoogleAdsException, GoogleAPICallError, grpc.RpcError)
+
+# Queries
+USER_LIST_BY_NAME_QUERY = '''
+      SELECT
+        user_list.id,
+        user_list.name
+      FROM user_list
+      WHERE user_list.name = '{list_name}'
+      '''
+JOB_STATUS_QUERY = '''
+        SELECT
+          offline_user_data_job.resource_name,
+          offline_user_data_job.id,
+          offline_user_data_job.status,
+          offline_user_data_job.type,
+          offline_user_data_job.failure_reason
+        FROM offline_user_data_job
+        WHERE offline_user_data_job.resource_name =
+          '{resource_name}'
+        LIMIT 1'''
+USER_LIST_INFO_QUERY = '''
+      SELECT
+        user_list.size_for_display,
+        user_list.size_for_search
+      FROM user_list
+      WHERE user_list.resource_name = '{resource_name}'
+  '''
+
+# Customer data columns and the UserIdentifier field they are uploaded to.
+IDENTIFIER_FIELDS = (
+    ('emails', 'hashed_email'),
+    ('phones', 'hashed_phone_number'),
+    ('mobile_ids', 'mobile_id'),
+    ('user_ids', 'third_party_user_id'),
+)
+
 
 def generate_list_data_base(list_type):
   """Generates an empty customer list data object.
 
+  The data is stored column-wise: one flat list per field. The address fields
+  are kept in separate, aligned columns (one entry per address).
+
   Args:
     list_type: The type of customer list (based on CustomerMatchUploadKeyType).
 
@@ -67,7 +145,10 @@ def generate_list_data_base(list_type):
   if list_type == CONTACT_INFO:
     data_base['emails'] = []
     data_base['phones'] = []
-    data_base['addresses'] = []
+    data_base['first_names'] = []
+    data_base['last_names'] = []
+    data_base['country_codes'] = []
+    data_base['zip_codes'] = []
   elif list_type == MOBILE_ADVERTISING_ID:
     data_base['mobile_ids'] = []
   elif list_type == CRM_ID:
@@ -83,78 +164,380 @@ def is_list_empty(customer_data):
   return True
 
 
-def read_csv(path, list_type, hash_required):
-  """Reads customer data from CSV and stores it in memory.
+def count_identifiers(customer_data):
+  """Counts the user identifiers (one per operation) in customer list data.
 
   Args:
-    path: CSV file path.
-    list_type: The type of customer list (based on CustomerMatchUploadKeyType).
-    hash_required: Indicates if the customer data needs to be hashed.
+    customer_data: A customer list data object.
 
   Returns:
-    customer_data: Processed data from CSV.
+    The number of user identifiers.
   """
-  with open(path, mode='r') as csv_file:
-    csv_reader = csv.DictReader(csv_file)
-    line_count = 0
+  return (sum(
+      len(customer_data.get(data_type, ()))
+      for data_type, _ in IDENTIFIER_FIELDS) +
+          len(customer_data.get('first_names', ())))
 
-    customer_data = {}
 
-    for row in csv_reader:
-      if HEADER_LINE and line_count == 0:
-        # Skip Header Line
-        line_count += 1
-        next  # pylint: disable=pointless-statement
+def iter_csv_batches(path, list_type):
+  """Reads the raw customer data from CSV in batches, grouped by list name.
+
+  Rows are read with csv.reader and the fields are accessed by position, so no
+  dict is allocated per row. Each list accumulates its own batch, which is
+  yielded as soon as it holds OPERATIONS_PER_REQUEST identifiers, so only one
+  batch per list is kept in memory. The remaining (possibly empty) batch of
+  every list is yielded once the whole file has been read.
+
+  Args:
+    path: CSV file path.
+    list_type: The type of customer list (based on CustomerMatchUploadKeyType).
+
+  Yields:
+    (list_name, columns) tuples, where columns is a customer list data object
+    (see generate_list_data_base) holding raw (unhashed) values.
+  """
+  with open(path, mode='r', newline='') as csv_file:
+    csv_reader = csv.reader(csv_file)
+    # The first line is always the header, which names the columns.
+    header = next(csv_reader, [])
+    line_count = 1
+
+    # Missing columns point to an extra cell past the header.
+    index = {name: i for i, name in enumerate(header)}
+    list_index = index.get(LIST_NAME, len(header))
+    email_index = index.get(EMAIL, len(header))
+    phone_index = index.get(PHONE, len(header))
+    first_name_index = index.get(FIRST_NAME, len(header))
+    last_name_index = index.get(LAST_NAME, len(header))
+    country_code_index = index.get(COUNTRY_CODE, len(header))
+    zip_code_index = index.get(ZIP_CODE, len(header))
+    mobile_id_index = index.get(MOBILE_ID, len(header))
+    user_id_index = index.get(USER_ID, len(header))
+    if list_type == CONTACT_INFO:
+      used_indices = (list_index, email_index, phone_index, first_name_index,
+                      last_name_index, country_code_index, zip_code_index)
+    elif list_type == MOBILE_ADVERTISING_ID:
+      used_indices = (list_index, mobile_id_index)
+    elif list_type == CRM_ID:
+      used_indices = (list_index, user_id_index)
+    else:
+      used_indices = (list_index,)
+    # Short rows are padded up to the last cell read, so rows with all the
+    # columns used by the list type are not copied, and their cells past the
+    # header are never read. If a used column is missing, the cells past the
+    # header are dropped first, so the extra cell it points to is empty (cells
+    # past the header are ignored, as csv.DictReader did).
+    header_width = len(header)
+    has_missing_columns = header_width in used_indices
+    width = max(used_indices) + 1
+
+    raw_data = {}
+    batch_sizes = {}
+
+    for line_count, row in enumerate(csv_reader, line_count + 1):
+      if has_missing_columns and len(row) > header_width:
+        del row[header_width:]
+      if len(row) < width:
+        row.extend([''] * (width - len(row)))
+
+      list_name = row[list_index] or GENERIC_LIST
+      columns = raw_data.get(list_name)
+      if columns is None:
+        columns = raw_data[list_name] = generate_list_data_base(list_type)
+      batch_size = batch_sizes.get(list_name, 0)
 
-      if row.get(LIST_NAME):
-        if not customer_data.get(row[LIST_NAME]):
-          customer_data[row[LIST_NAME]] = generate_list_data_base(list_type)
-        list_data = customer_data[row[LIST_NAME]]
-      else:
-        # Use generic list
-        if not customer_data.get(GENERIC_LIST):
-          customer_data[GENERIC_LIST] = generate_list_data_base(list_type)
-        list_data = customer_data[GENERIC_LIST]
       if list_type == CONTACT_INFO:
-        if row.get(EMAIL):
-          if hash_required:
-            list_data['emails'].append(
-                {'hashed_email': normalize_and_sha256(row[EMAIL])})
-          else:
-            list_data['emails'].append({'hashed_email': row[EMAIL]})
-
-        if row.get(PHONE):
-          if hash_required:
-            list_data['phones'].append(
-                {'hashed_phone_number': normalize_and_sha256(row[PHONE])})
-          else:
-            list_data['phones'].append({'hashed_phone_number': row[PHONE]})
-
-        if (row.get(FIRST_NAME) and row.get(LAST_NAME) and
-            row.get(COUNTRY_CODE) and row.get(ZIP_CODE)):
-          address = {}
-          if hash_required:
-            address['hashed_first_name'] = normalize_and_sha256(row[FIRST_NAME])
-            address['hashed_last_name'] = normalize_and_sha256(row[LAST_NAME])
-          else:
-            address['hashed_first_name'] = row[FIRST_NAME]
-            address['hashed_last_name'] = row[LAST_NAME]
-          address['country_code'] = row[COUNTRY_CODE]
-          address['zip_code'] = row[ZIP_CODE]
-          list_data['addresses'].append(address)
+        if row[email_index]:
+          columns['emails'].append(row[email_index])
+          batch_size += 1
+
+        if row[phone_index]:
+          columns['phones'].append(row[phone_index])
+          batch_size += 1
+
+        if (row[first_name_index] and row[last_name_index] and
+            row[country_code_index] and row[zip_code_index]):
+          columns['first_names'].append(row[first_name_index])
+          columns['last_names'].append(row[last_name_index])
+          columns['country_codes'].append(row[country_code_index])
+          columns['zip_codes'].append(row[zip_code_index])
+          batch_size += 1
 
       elif list_type == MOBILE_ADVERTISING_ID:
-        if row.get(MOBILE_ID):
-          list_data['mobile_ids'].append({'mobile_id': row[MOBILE_ID]})
+        if row[mobile_id_index]:
+          columns['mobile_ids'].append(row[mobile_id_index])
+          batch_size += 1
 
       elif list_type == CRM_ID:
-        if row.get(USER_ID):
-          list_data['user_ids'].append({'third_party_user_id': row[USER_ID]})
-      line_count += 1
+        if row[user_id_index]:
+          columns['user_ids'].append(row[user_id_index])
+          batch_size += 1
+
+      if batch_size >= OPERATIONS_PER_REQUEST:
+        yield list_name, columns
+        raw_data[list_name] = generate_list_data_base(list_type)
+        batch_size = 0
+      batch_sizes[list_name] = batch_size
 
     print(f'Processed {line_count} lines from file {path}.')
 
-    return customer_data
+    yield from raw_data.items()
+
+
+def hash_columns(columns):
+  """Normalizes and hashes the PII columns of a customer list data object.
+
+  Args:
+    columns: A customer list data object holding raw values.
+
+  Returns:
+    The same object, with the columns in HASHED_COLUMNS replaced by their
+    hashed values.
+  """
+  for name in HASHED_COLUMNS:
+    if columns.get(name):
+      columns[name] = hash_many(columns[name])
+  return columns
+
+
+def read_ahead(iterable, max_items):
+  """Iterates over an iterable in a background thread.
+
+  The items are produced by a separate thread and handed over through a bounded
+  queue, so producing the next items (e.g. reading the file) overlaps with the
+  work done on the current one.
+
+  Args:
+    iterable: The iterable to read ahead.
+    max_items: The maximum number of items produced ahead of the consumer.
+
+  Yields:
+    The items of the iterable, in order. Exceptions raised by the iterable are
+    raised again in the consumer.
+  """
+  items = queue.Queue(maxsize=max_items)
+  end = object()
+
+  def produce():
+    try:
+      for item in iterable:
+        items.put((item, None))
+    except Exception as ex:  # pylint: disable=broad-except
+      items.put((end, ex))
+    else:
+      items.put((end, None))
+
+  threading.Thread(target=produce, daemon=True).start()
+  while True:
+    item, error = items.get()
+    if item is end:
+      if error:
+        raise error
+      return
+    yield item
+
+
+def hash_batches(batches):
+  """Hashes batches of raw customer data using all the CPU cores.
+
+  Hashing is CPU-bound, so the batches are spread over a process pool. A
+  bounded number of batches is hashed ahead of the consumer, which overlaps
+  reading the file, hashing and uploading while keeping memory usage
+  independent of the file size.
+
+  Args:
+    batches: An iterable of (list_name, columns) tuples with raw values.
+
+  Yields:
+    The (list_name, columns) tuples, in the same order, with hashed values.
+  """
+  processes = os.cpu_count() or 1
+  pending = collections.deque()
+  with multiprocessing.Pool(processes) as pool:
+    for list_name, columns in batches:
+      pending.append((list_name, pool.apply_async(hash_columns, (columns,))))
+      if len(pending) >= 2 * processes:
+        list_name, result = pending.popleft()
+        yield list_name, result.get()
+    for list_name, result in pending:
+      yield list_name, result.get()
+
+
+def remove_duplicates(columns, seen):
+  """Removes the identifiers that were already found in the list.
+
+  Customer exports often repeat the same customer, and uploading an identifier
+  twice only wastes operations.
+
+  Args:
+    columns: A customer list data object. Its columns are replaced by lists
+        without the repeated identifiers.
+    seen: A dict of sets with the keys of the identifiers previously found in
+        the list, per column. It's updated with the identifiers of the batch.
+
+  Returns:
+    The same customer list data object.
+  """
+  for data_type, _ in IDENTIFIER_FIELDS:
+    if columns.get(data_type):
+      columns[data_type] = _unique(columns[data_type],
+                                   seen.setdefault(data_type, set()),
+                                   _identifier_key)
+
+  if columns.get('first_names'):
+    addresses = _unique(
+        zip(columns['first_names'], columns['last_names'],
+            columns['country_codes'], columns['zip_codes']),
+        seen.setdefault('addresses', set()), _address_key)
+    columns['first_names'] = [address[0] for address in addresses]
+    columns['last_names'] = [address[1] for address in addresses]
+    columns['country_codes'] = [address[2] for address in addresses]
+    columns['zip_codes'] = [address[3] for address in addresses]
+
+  return columns
+
+
+def _unique(values, seen_keys, key_function):
+  """Returns the values whose key isn't in seen_keys, without repetitions.
+
+  Args:
+    values: The values to filter.
+    seen_keys: A set with the keys of the values already found. It's updated
+        with the keys of the returned values.
+    key_function: The function returning the key of a value.
+
+  Returns:
+    A list with the unique values, in order.
+  """
+  unique_values = []
+  for value in values:
+    key = key_function(value)
+    if key not in seen_keys:
+      seen_keys.add(key)
+      unique_values.append(value)
+  return unique_values
+
+
+def _identifier_key(value):
+  """Returns a compact key for an identifier, to find repeated identifiers.
+
+  Only the keys of the identifiers found are kept for the whole run, and a
+  16-byte BLAKE2b digest takes less than half the memory of a hex SHA-256
+  string, with a negligible chance of collision.
+  """
+  return hashlib.blake2b(
+      value.encode(), digest_size=DEDUPLICATION_KEY_BYTES).digest()
+
+
+def _address_key(address):
+  """Returns a compact key for an address tuple, see _identifier_key."""
+  key = hashlib.blake2b(digest_size=DEDUPLICATION_KEY_BYTES)
+  for field in address:
+    data = field.encode()
+    # The length keeps the fields apart, e.g. ('ab', 'c') from ('a', 'bc').
+    key.update(len(data).to_bytes(8, 'little'))
+    key.update(data)
+  return key.digest()
+
+
+def read_csv(path, list_type, hash_required):
+  """Reads customer data from CSV in batches, hashing it if required.
+
+  The file is read in a background thread, ahead of the hashing and the
+  consumer. Files with up to SERIAL_HASHING_MAX_IDENTIFIERS identifiers are
+  read and hashed in this process instead. The identifiers repeated within a
+  list are only returned the first time they are found.
+
+  Only a batch per list is kept in memory, but finding the repeated
+  identifiers needs a compact key (about 100 bytes with its set entry) per
+  distinct identifier of the file, so memory usage still grows with the number
+  of distinct identifiers.
+
+  Args:
+    path: CSV file path.
+    list_type: The type of customer list (based on CustomerMatchUploadKeyType).
+    hash_required: Indicates if the customer data needs to be hashed.
+
+  Yields:
+    (list_name, customer_data) tuples, with the customer data of a batch of
+    the list (see generate_list_data_base).
+  """
+  batches = iter_csv_batches(path, list_type)
+  if not hash_required:
+    batches = read_ahead(batches, READ_AHEAD_BATCHES)
+  else:
+    # Starting the hashing processes costs more than hashing a small file, so
+    # the first batches are read here to find out if the file is small.
+    first_batches = []
+    identifiers = 0
+    for list_name, customer_data in batches:
+      first_batches.append((list_name, customer_data))
+      identifiers += count_identifiers(customer_data)
+      if identifiers > SERIAL_HASHING_MAX_IDENTIFIERS:
+        # Generators only start on the first item, so the hashing processes
+        # are forked before the reader thread is started.
+        batches = hash_batches(itertools.chain(
+            first_batches, read_ahead(batches, READ_AHEAD_BATCHES)))
+        break
+    else:
+      batches = ((list_name, hash_columns(customer_data))
+                 for list_name, customer_data in first_batches)
+
+  seen = collections.defaultdict(dict)
+  for list_name, customer_data in batches:
+    yield list_name, remove_duplicates(customer_data, seen[list_name])
+
+
+@functools.lru_cache(maxsize=None)
+def get_service(client, name):
+  """Gets a service client, creating it only on the first call.
+
+  Each new service client opens its own gRPC channel, so a single instance is
+  shared by all the calls (and threads) using the service.
+
+  Args:
+    client: The Google Ads client instance.
+    name: The name of the service, e.g. 'GoogleAdsService'.
+
+  Returns:
+    The service client.
+  """
+  return client.get_service(name)
+
+
+def get_enum_name(client, enum_name, value):
+  """Gets the name of an enum value, with or without proto-plus messages.
+
+  Without proto-plus (use_proto_plus: False), enum fields are plain ints, so
+  the name is resolved from the enum type of the installed API version.
+
+  Args:
+    client: The Google Ads client instance.
+    enum_name: The name of the enum, e.g. 'OfflineUserDataJobStatus'.
+    value: The enum value, as read from a message field.
+
+  Returns:
+    The name of the enum value.
+  """
+  enum_type = getattr(client.get_type(f'{enum_name}Enum'), enum_name)
+  if hasattr(enum_type, 'Name'):
+    return enum_type.Name(value)
+  return enum_type(value).name
+
+
+def escape_query_string(value):
+  """Escapes a value to be used in a single-quoted GAQL string literal.
+
+  Names like "John's List" would otherwise end the literal early and make the
+  query invalid.
+
+  Args:
+    value: The string to escape.
+
+  Returns:
+    The escaped string, without the surrounding quotes.
+  """
+  return value.replace('\\', '\\\\').replace("'", "\\'")
 
 
 def get_user_list_resource_name(client, customer_id, list_name):
@@ -168,14 +551,9 @@ def get_user_list_resource_name(client, customer_id, list_name):
   Returns:
     The User List resource name.
   """
-  googleads_service_client = client.get_service('GoogleAdsService')
-  query = f'''
-      SELECT
-        user_list.id,
-        user_list.name
-      FROM user_list
-      WHERE user_list.name = '{list_name}'
-      '''
+  googleads_service_client = get_service(client, 'GoogleAdsService')
+  query = USER_LIST_BY_NAME_QUERY.format(
+      list_name=escape_query_string(list_name))
 
   search_results = googleads_service_client.search(
       customer_id=customer_id, query=query)
@@ -187,6 +565,100 @@ def get_user_list_resource_name(client, customer_id, list_name):
   return user_list_resource_name
 
 
+def load_list_cache(path):
+  """Loads the cached user list resource names, dropping the expired ones.
+
+  Args:
+    path: The cache file path. If empty, the cache is disabled.
+
+  Returns:
+    A dict mapping '<customer_id>/<list_name>' keys to cache entries. It is
+    empty if the cache file is missing, unreadable or malformed, and malformed
+    entries are dropped.
+  """
+  if not path:
+    return {}
+  try:
+    with open(os.path.expanduser(path), mode='r') as cache_file:
+      list_cache = json.load(cache_file)
+  except (OSError, ValueError):
+    return {}
+  if not isinstance(list_cache, dict):
+    return {}
+
+  min_updated = time.time() - LIST_CACHE_MAX_AGE_DAYS * 24 * 60 * 60
+  return {
+      key: entry
+      for key, entry in list_cache.items()
+      if isinstance(entry, dict) and
+      isinstance(entry.get('resource_name'), str) and
+      isinstance(entry.get('updated'), (int, float)) and
+      entry['updated'] >= min_updated
+  }
+
+
+def save_list_cache(path, list_cache):
+  """Saves the cached user list resource names.
+
+  Args:
+    path: The cache file path. If empty, the cache is disabled.
+    list_cache: A dict mapping '<customer_id>/<list_name>' keys to cache
+        entries, as returned by load_list_cache.
+  """
+  if not path:
+    return
+  path = os.path.expanduser(path)
+  try:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode='w') as cache_file:
+      json.dump(list_cache, cache_file, indent=2)
+  except OSError as ex:
+    print(f'The user list cache could not be saved to {path}: {ex}')
+
+
+def get_or_create_user_list(client, customer_id, list_name, list_type, app_id,
+                            list_cache):
+  """Gets the User List resource name, creating the list if it's missing.
+
+  The resource name is looked up in the list cache first, so known lists don't
+  need any request. Otherwise the list is created right away, and it's only
+  searched by name if it can't be created (e.g. the name is already used), so
+  new lists need a single request.
+
+  Args:
+    client: The Google Ads client instance.
+    customer_id: The customer ID for which to add the user list.
+    list_name: The name of the user list.
+    list_type: The type of customer list (based on CustomerMatchUploadKeyType).
+    app_id: App ID required only for mobile advertising lists.
+    list_cache: A dict with the cached user lists, as returned by
+        load_list_cache. It's updated with the list.
+
+  Returns:
+    The User List resource name.
+  """
+  key = f'{customer_id}/{list_name}'
+  if key in list_cache:
+    return list_cache[key]['resource_name']
+
+  try:
+    user_list_resource_name = create_user_list(client, customer_id, list_name,
+                                               list_type, app_id)
+  except GoogleAdsException:
+    # The list may already exist, and lists that can't be created here (e.g.
+    # mobile lists without an app ID) can still be uploaded to if they do.
+    user_list_resource_name = get_user_list_resource_name(
+        client, customer_id, list_name)
+    if not user_list_resource_name:
+      raise
+
+  list_cache[key] = {
+      'resource_name': user_list_resource_name,
+      'updated': time.time(),
+  }
+  return user_list_resource_name
+
+
 def create_user_list(client, customer_id, list_name, list_type, app_id=None):
   """Creates a User List using the name provided.
 
@@ -200,16 +672,15 @@ def create_user_list(client, customer_id, list_name, list_type, app_id=None):
   Returns:
     The User List resource name.
   """
-  print(f'The user list {list_name} will be created.')
-  user_list_service_client = client.get_service('UserListService')
+  user_list_service_client = get_service(client, 'UserListService')
   user_list_operation = client.get_type('UserListOperation')
 
   # Creates the new user list.
   user_list = user_list_operation.create
   user_list.name = list_name
   user_list.description = ('This is a list of users uploaded using Ads API.')
-  user_list.crm_based_user_list.upload_key_type = (
-      customer_match_upload_key_type.CustomerMatchUploadKeyTypeEnum.CustomerMatchUploadKeyType[list_type])
+  user_list.crm_based_user_list.upload_key_type = getattr(
+      client.enums.CustomerMatchUploadKeyTypeEnum, list_type)
   if list_type == MOBILE_ADVERTISING_ID:
     user_list.crm_based_user_list.app_id = app_id
 
@@ -223,27 +694,24 @@ def create_user_list(client, customer_id, list_name, list_type, app_id=None):
   return user_list_resource_name
 
 
-def add_users_to_customer_match_user_list(client, customer_id,
-                                          user_list_resource_name,
-                                          customer_data, skip_polling):
-  """Uses Customer Match to create and add users to a new user list.
+def create_offline_user_data_job(client, customer_id, user_list_resource_name):
+  """Creates an offline user data job to add users to a Customer Match list.
 
   Args:
     client: The Google Ads client.
     customer_id: The customer ID for which to add the user list.
     user_list_resource_name: The resource name of the user list to which to
         add users.
-    customer_data: Processed customer data to be uploaded.
-    skip_polling: A bool dictating whether to poll the API for completion.
-  """
 
-  offline_user_data_job_service_client = client.get_service(
-      'OfflineUserDataJobService')
+  Returns:
+    The offline user data job resource name.
+  """
+  offline_user_data_job_service_client = get_service(
+      client, 'OfflineUserDataJobService')
 
   offline_user_data_job = client.get_type('OfflineUserDataJob')
-  offline_user_data_job.type_ = client.get_type(
-      'OfflineUserDataJobTypeEnum'
-  ).OfflineUserDataJobType.CUSTOMER_MATCH_USER_LIST
+  offline_user_data_job.type_ = (
+      client.enums.OfflineUserDataJobTypeEnum.CUSTOMER_MATCH_USER_LIST)
   offline_user_data_job.customer_match_user_list_metadata.user_list = (
       user_list_resource_name)
 
@@ -255,101 +723,256 @@ def add_users_to_customer_match_user_list(client, customer_id,
       create_offline_user_data_job_response.resource_name)
   print('Created an offline user data job with resource name: '
         f'"{offline_user_data_job_resource_name}".')
+  return offline_user_data_job_resource_name
+
+
+def create_user_list_job(client, customer_id, list_name, list_type, app_id,
+                         list_cache):
+  """Gets or creates a user list, and creates an offline user data job for it.
+
+  A cached user list may have been removed since it was cached. If the job
+  can't be created for a cached list, its cache entry is dropped and the list
+  is resolved again (created, or looked up by name) before trying once more.
+
+  Args:
+    client: The Google Ads client.
+    customer_id: The customer ID for which to add the user list.
+    list_name: The name of the user list.
+    list_type: The type of customer list (based on CustomerMatchUploadKeyType).
+    app_id: App ID required only for mobile advertising lists.
+    list_cache: A dict with the cached user lists, as returned by
+        load_list_cache. It's updated with the list.
+
+  Returns:
+    A (user list resource name, offline user data job resource name) tuple.
+  """
+  key = f'{customer_id}/{list_name}'
+  cached = key in list_cache
+  user_list_resource_name = get_or_create_user_list(
+      client, customer_id, list_name, list_type, app_id, list_cache)
+  try:
+    return user_list_resource_name, create_offline_user_data_job(
+        client, customer_id, user_list_resource_name)
+  except GoogleAdsException as ex:
+    if not cached:
+      raise
+    print(f'The cached user list \'{user_list_resource_name}\' could not be '
+          f'used, the list \'{list_name}\' will be resolved again.')
+    print_google_ads_exception(ex)
+
+  del list_cache[key]
+  user_list_resource_name = get_or_create_user_list(
+      client, customer_id, list_name, list_type, app_id, list_cache)
+  return user_list_resource_name, create_offline_user_data_job(
+      client, customer_id, user_list_resource_name)
+
+
+def upload_batch(client, offline_user_data_job_service_client,
+                 offline_user_data_job_resource_name, customer_data):
+  """Adds a batch of customer data to an offline user data job.
+
+  Args:
+    client: The Google Ads client.
+    offline_user_data_job_service_client: The OfflineUserDataJobService
+        client. It can be shared by several threads.
+    offline_user_data_job_resource_name: The resource name of the offline
+        user data job to add the operations to.
+    customer_data: Processed customer data batch to be uploaded.
 
+  Returns:
+    The AddOfflineUserDataJobOperationsResponse.
+  """
   request = client.get_type('AddOfflineUserDataJobOperationsRequest')
   request.resource_name = offline_user_data_job_resource_name
-  request.operations.extend(build_offline_user_data_job_operations(
-      client, customer_data))
+  build_offline_user_data_job_operations(request, customer_data)
+  # Keeps the valid operations when some of them fail, and reports the
+  # problems that don't make an operation fail as warnings.
   request.enable_partial_failure = True
+  request.enable_warnings = True
+
+  # Issues a request to add the operations to the offline user data job. The
+  # batches of a job are added concurrently, so transient errors such as
+  # concurrent modifications are retried with exponential backoff and jitter.
+  add_operations = (
+      offline_user_data_job_service_client.add_offline_user_data_job_operations)
+  for attempt in range(1, UPLOAD_MAX_ATTEMPTS + 1):
+    try:
+      return add_operations(request=request)
+    except REQUEST_ERRORS as ex:
+      if attempt == UPLOAD_MAX_ATTEMPTS or not is_retryable_error(client, ex):
+        raise
+      interval = min(UPLOAD_RETRY_MIN_INTERVAL_SECONDS * 2**(attempt - 1),
+                     UPLOAD_RETRY_MAX_INTERVAL_SECONDS)
+      print(f'Adding operations to {offline_user_data_job_resource_name} '
+            f'failed, retrying in about {interval} seconds: {ex}')
+      time.sleep(random.uniform(interval / 2, interval))
+
+
+def is_retryable_error(client, ex):
+  """Checks if a failed request may succeed when it's sent again.
+
+  Args:
+    client: The Google Ads client.
+    ex: The exception raised by the request, one of REQUEST_ERRORS.
+
+  Returns:
+    True if all the API errors are in RETRYABLE_ERRORS, or the request failed
+    with a gRPC status in RETRYABLE_STATUS_CODES.
+  """
+  if isinstance(ex, (DeadlineExceeded, ServiceUnavailable)):
+    return True
+  if not isinstance(ex, GoogleAdsException):
+    code = getattr(ex, 'code', None)
+    return callable(code) and code() in RETRYABLE_STATUS_CODES
+
+  retryable_enum_names = {enum_name for enum_name, _ in RETRYABLE_ERRORS}
+  for error in ex.failure.errors:
+    # The error code is a oneof of error enums, e.g. database_error.
+    error_code = _protobuf(error.error_code)
+    kind = error_code.WhichOneof('error_code') or ''
+    enum_name = ''.join(word.capitalize() for word in kind.split('_'))
+    if enum_name not in retryable_enum_names:
+      return False
+    error_name = get_enum_name(client, enum_name, getattr(error_code, kind))
+    if (enum_name, error_name) not in RETRYABLE_ERRORS:
+      return False
+  return bool(ex.failure.errors)
+
+
+def run_offline_user_data_job(client, offline_user_data_job_resource_name):
+  """Runs an offline user data job once all its operations have been added.
+
+  The job is only started, so several jobs can run at the same time.
+
+  Args:
+    client: The Google Ads client.
+    offline_user_data_job_resource_name: The resource name of the offline
+        user data job to run.
+
+  Returns:
+    The long-running operation of the job, which can be waited on with its
+    result method.
+  """
+  offline_user_data_job_service_client = get_service(
+      client, 'OfflineUserDataJobService')
+
+  # Issues a request to run the offline user data job for executing all
+  # added operations.
+  return offline_user_data_job_service_client.run_offline_user_data_job(
+      resource_name=offline_user_data_job_resource_name)
 
-  # Issues a request to add the operations to the offline user data job.
-  response = offline_user_data_job_service_client.add_offline_user_data_job_operations(
-      request=request)
 
-  # Prints the status message if any partial failure error is returned.
-  # Note: the details of each partial failure error are not printed here.
-  # Refer to the error_handling/handle_partial_failure.py example to learn
-  # more.
+def print_partial_failure(client, response, offset=0):
+  """Prints the partial failures and warnings of an add operations response.
+
+  Args:
+    client: The Google Ads client.
+    response: The AddOfflineUserDataJobOperationsResponse to inspect.
+    offset: The position of the request's first operation among all the
+        operations added to the job, used to report absolute indexes.
+  """
   # Extracts the partial failure from the response status.
   partial_failure = getattr(response, 'partial_failure_error', None)
   if getattr(partial_failure, 'code', None) != 0:
-    error_details = getattr(partial_failure, 'details', [])
-    for error_detail in error_details:
-      failure_message = client.get_type('GoogleAdsFailure')
-      # Retrieve the class definition of the GoogleAdsFailure instance
-      # in order to use the "deserialize" class method to parse the
-      # error_detail string into a protobuf message object.
-      failure_object = type(failure_message).deserialize(error_detail.value)
-
-      for error in failure_object.errors:
-        print('A partial failure at index '
-              f'{error.location.field_path_elements[0].index} occurred.\n'
-              f'Error message: {error.message}\n'
-              f'Error code: {error.error_code}')
-
-  print('The operations are added to the offline user data job.')
+    print_failure_details(client, partial_failure, offset, 'partial failure')
 
-  # Issues a request to run the offline user data job for executing all
-  # added operations.
-  operation_response = (
-      offline_user_data_job_service_client.run_offline_user_data_job(
-          resource_name=offline_user_data_job_resource_name))
-
-  if skip_polling:
-    check_job_status(
-        client,
-        customer_id,
-        offline_user_data_job_resource_name,
-        user_list_resource_name,
-    )
-  else:
-    # Wait until the operation has finished.
-    print('Request to execute the added operations started.')
-    print('Waiting until operation completes...')
-    operation_response.result()
-    print_customer_match_user_list_info(client, customer_id,
-                                        user_list_resource_name)
+  # Warnings are returned in the same format, in the warning status.
+  print_failure_details(client, getattr(response, 'warning', None), offset,
+                        'warning')
 
 
-def build_offline_user_data_job_operations(client, customer_data):
-  """Builds the schema of user data as defined in the API.
+def print_failure_details(client, status, offset, kind):
+  """Prints the GoogleAdsFailure details of a response status.
 
   Args:
     client: The Google Ads client.
-    customer_data: Processed customer data to be uploaded.
+    status: The status holding the failure details, or None.
+    offset: The position of the request's first operation among all the
+        operations added to the job, used to report absolute indexes.
+    kind: The kind of failure, used in the printed messages.
+  """
+  error_details = getattr(status, 'details', [])
+  if not error_details:
+    return
+  # Retrieve the protobuf class of the GoogleAdsFailure message in order to
+  # use its "FromString" class method to parse the error_detail string. Only
+  # proto-plus classes have "deserialize", so this works with either setting.
+  failure_class = type(_protobuf(client.get_type('GoogleAdsFailure')))
+  for error_detail in error_details:
+    try:
+      failure_object = failure_class.FromString(error_detail.value)
+    except DecodeError as ex:
+      print(f'A {kind} could not be decoded: {ex}')
+      continue
+
+    for error in failure_object.errors:
+      field_path_elements = error.location.field_path_elements
+      if field_path_elements:
+        index = offset + field_path_elements[0].index
+        print(f'A {kind} at index {index} occurred.')
+      else:
+        print(f'A {kind} occurred.')
+      print(f'Error message: {error.message}\n'
+            f'Error code: {error.error_code}')
 
-  Returns:
-    A list containing the operations.
+
+def build_offline_user_data_job_operations(request, customer_data):
+  """Builds the schema of user data as defined in the API.
+
+  The operations are added in place to the request's repeated field, so no
+  intermediate operation objects are created and copied.
+
+  Args:
+    request: The AddOfflineUserDataJobOperationsRequest to add the operations
+        to.
+    customer_data: Processed customer data to be uploaded.
   """
+  operations = _protobuf(request).operations
+
+  # Each column is paired with the function that sets its values, so the
+  # per-operation loop doesn't need to check the data type.
+  columns = [(customer_data.get(data_type, ()), _field_setter(field))
+             for data_type, field in IDENTIFIER_FIELDS]
+  columns.append((zip(
+      customer_data.get('first_names', ()),
+      customer_data.get('last_names', ()),
+      customer_data.get('country_codes', ()),
+      customer_data.get('zip_codes', ()),
+  ), _set_address_info))
+
+  for values, set_identifier in columns:
+    for value in values:
+      set_identifier(operations.add().create.user_identifiers.add(), value)
+
+
+def _protobuf(message):
+  """Returns the protobuf message wrapped by a proto-plus message, or itself.
+
+  The client returns proto-plus messages unless use_proto_plus is False. Their
+  repeated fields can't build items in place, but changes to the wrapped
+  protobuf message are reflected in them.
+  """
+  message_type = type(message)
+  return message_type.pb(message) if hasattr(message_type, 'pb') else message
+
 
-  customer_data_operations = []
+def _field_setter(field):
+  """Returns a function that sets a UserIdentifier field to a value."""
 
-  for data_type in customer_data:
-    for item in customer_data[data_type]:
-      # Creates a first user data based on an email address.
-      user_data_operation = client.get_type('OfflineUserDataJobOperation')
-      user_data = user_data_operation.create
-      user_identifier = client.get_type('UserIdentifier')
+  def set_field(user_identifier, value):
+    setattr(user_identifier, field, value)
 
-      if data_type == 'emails':
-        user_identifier.hashed_email = item['hashed_email']
-      elif data_type == 'phones':
-        user_identifier.hashed_phone_number = item['hashed_phone_number']
-      elif data_type == 'mobile_ids':
-        user_identifier.mobile_id = item['mobile_id']
-      elif data_type == 'user_ids':
-        user_identifier.third_party_user_id = item['third_party_user_id']
-      elif data_type == 'addresses':
-        user_identifier.address_info.hashed_first_name = item[
-            'hashed_first_name']
-        user_identifier.address_info.hashed_last_name = item['hashed_last_name']
-        user_identifier.address_info.country_code = item['country_code']
-        user_identifier.address_info.postal_code = item['postal_code']
-      user_data.user_identifiers.append(user_identifier)
+  return set_field
 
-      customer_data_operations.append(user_data_operation)
 
-  return customer_data_operations
+def _set_address_info(user_identifier, address):
+  """Sets the address info of a UserIdentifier from an address tuple."""
+  first_name, last_name, country_code, zip_code = address
+  address_info = user_identifier.address_info
+  address_info.hashed_first_name = first_name
+  address_info.hashed_last_name = last_name
+  address_info.country_code = country_code
+  address_info.postal_code = zip_code
 
 
 def check_job_status(
@@ -368,30 +991,22 @@ def check_job_status(
     user_list_resource_name: The resource name of the customer match user
         list
   """
-  query = f'''
-        SELECT
-          offline_user_data_job.resource_name,
-          offline_user_data_job.id,
-          offline_user_data_job.status,
-          offline_user_data_job.type,
-          offline_user_data_job.failure_reason
-        FROM offline_user_data_job
-        WHERE offline_user_data_job.resource_name =
-          '{offline_user_data_job_resource_name}'
-        LIMIT 1'''
+  query = JOB_STATUS_QUERY.format(
+      resource_name=offline_user_data_job_resource_name)
 
   # Issues a search request using streaming.
-  google_ads_service = client.get_service('GoogleAdsService')
-  results = google_ads_service.search(customer_id=customer_id, query=query)
-  offline_user_data_job = next(iter(results)).offline_user_data_job
-  job_type_enum = offline_user_data_job_type.OfflineUserDataJobTypeEnum.OfflineUserDataJobType(
-      offline_user_data_job.type_)
-  status_name_enum = offline_user_data_job_status.OfflineUserDataJobStatusEnum.OfflineUserDataJobStatus(
-      offline_user_data_job.status)
-  status_name = status_name_enum.name
+  google_ads_service = get_service(client, 'GoogleAdsService')
+  stream = google_ads_service.search_stream(
+      customer_id=customer_id, query=query)
+  offline_user_data_job = next(
+      row for batch in stream for row in batch.results).offline_user_data_job
+  status_name = get_enum_name(client, 'OfflineUserDataJobStatus',
+                              offline_user_data_job.status)
+  type_name = get_enum_name(client, 'OfflineUserDataJobType',
+                            offline_user_data_job.type_)
 
   print(f'Offline user data job ID \'{offline_user_data_job.id}\' with type '
-        f'\'{job_type_enum.name}\' has status: {status_name}')
+        f'\'{type_name}\' has status: {status_name}')
 
   if status_name == 'SUCCESS':
     print_customer_match_user_list_info(client, customer_id,
@@ -418,23 +1033,17 @@ def print_customer_match_user_list_info(client, customer_id,
       user_list_resource_name: The resource name of the user list to which to
           add users.
   """
-  googleads_service_client = client.get_service('GoogleAdsService')
+  googleads_service_client = get_service(client, 'GoogleAdsService')
 
   # Creates a query that retrieves the user list.
-  query = f'''
-      SELECT
-        user_list.size_for_display,
-        user_list.size_for_search
-      FROM user_list
-      WHERE user_list.resource_name = '{user_list_resource_name}'
-  '''
+  query = USER_LIST_INFO_QUERY.format(resource_name=user_list_resource_name)
 
-  # Issues a search request.
-  search_results = googleads_service_client.search(
+  # Issues a search request using streaming.
+  stream = googleads_service_client.search_stream(
       customer_id=customer_id, query=query)
 
   # Prints out some information about the user list.
-  user_list = next(iter(search_results)).user_list
+  user_list = next(row for batch in stream for row in batch.results).user_list
   print('The estimated number of users that the user list '
         f'\'{user_list.resource_name}\' has is '
         f'{user_list.size_for_display} for Display and '
@@ -445,50 +1054,188 @@ def print_customer_match_user_list_info(client, customer_id,
 
 def upload_data(client,
                 customer_id,
-                list_name,
                 list_type,
-                customer_data,
+                batches,
                 skip_polling,
-                app_id=None):
-  """Uploads processed data to the specified list and creates it if necessary.
+                app_id=None,
+                max_workers=MAX_UPLOAD_WORKERS,
+                list_cache=None):
+  """Uploads processed data to the specified lists, creating them if needed.
+
+  Each list gets its own offline user data job, created when its first batch
+  arrives. The batches are uploaded concurrently as they are read, and the jobs
+  are all started once the whole file has been uploaded. A list whose upload
+  fails is skipped without affecting the other lists.
+
+  All the uploads share a single OfflineUserDataJobService client, so they are
+  multiplexed over one gRPC channel instead of opening a connection per batch.
 
   Args:
     client: The Google Ads client.
     customer_id: The customer ID for which to add the user list.
-    list_name: The name of the user list to modify.
     list_type: The type of customer list (based on CustomerMatchUploadKeyType).
-    customer_data: Processed customer data to be uploaded.
+    batches: An iterable of (list_name, customer_data) tuples, as returned by
+        read_csv.
     skip_polling: A bool dictating whether to poll the API for completion.
     app_id: App ID required only for mobile advertising lists.
+    max_workers: The maximum number of batches uploaded concurrently.
+    list_cache: A dict with the cached user lists, as returned by
+        load_list_cache. It's updated with the uploaded lists, and the lists
+        that failed are removed from it in case their cache entry is stale.
 
   Returns:
     None.
   """
+  if list_cache is None:
+    list_cache = {}
+  offline_user_data_job_service_client = get_service(
+      client, 'OfflineUserDataJobService')
+  jobs = {}
+  offsets = collections.Counter()
+  failed_lists = set()
+  pending = collections.deque()
+
+  def collect(list_name, offset, future):
+    try:
+      print_partial_failure(client, future.result(), offset)
+    except REQUEST_ERRORS as ex:
+      failed_lists.add(list_name)
+      print_google_ads_exception(ex)
+
+  # The batches are independent, so they are sent concurrently. The number of
+  # workers is kept low to stay within the API concurrent request limits, and
+  # at most that many batches are in flight so memory stays bounded.
+  with concurrent.futures.ThreadPoolExecutor(
+      max_workers=max_workers) as executor:
+    for list_name, customer_data in batches:
+      if list_name in failed_lists:
+        continue
+      if is_list_empty(customer_data):
+        if list_name not in jobs:
+          print(f'The list \'{list_name}\' will be skipped as no compatible '
+                'data has been found.')
+        continue
+
+      if list_name not in jobs:
+        print(f'Processing data for list \'{list_name}\'.')
+        try:
+          jobs[list_name] = create_user_list_job(client, customer_id,
+                                                 list_name, list_type, app_id,
+                                                 list_cache)
+        except REQUEST_ERRORS as ex:
+          failed_lists.add(list_name)
+          print_google_ads_exception(ex)
+          continue
+        print(f'Uploading data for list \'{list_name}\'')
+
+      future = executor.submit(upload_batch, client,
+                               offline_user_data_job_service_client,
+                               jobs[list_name][1], customer_data)
+      pending.append((list_name, offsets[list_name], future))
+      offsets[list_name] += count_identifiers(customer_data)
+      if len(pending) >= max_workers:
+        collect(*pending.popleft())
+
+    while pending:
+      collect(*pending.popleft())
+
+  operations = {}
+  for list_name, (_, offline_user_data_job_resource_name) in jobs.items():
+    if list_name in failed_lists:
+      continue
+    print(f'The operations are added to the offline user data job of list '
+          f'\'{list_name}\'.')
+    try:
+      operations[list_name] = run_offline_user_data_job(
+          client, offline_user_data_job_resource_name)
+    except REQUEST_ERRORS as ex:
+      failed_lists.add(list_name)
+      print_google_ads_exception(ex)
+
+  # All the jobs are started before waiting for any of them, so they run at the
+  # same time and waiting for each in turn takes as long as the slowest one.
+  if operations and not skip_polling:
+    print('Request to execute the added operations started.')
+    print('Waiting until operations complete...')
+  for list_name, operation_response in operations.items():
+    user_list_resource_name, offline_user_data_job_resource_name = (
+        jobs[list_name])
+    try:
+      if skip_polling:
+        check_job_status(client, customer_id,
+                         offline_user_data_job_resource_name,
+                         user_list_resource_name)
+      else:
+        operation_response.result()
+        print_customer_match_user_list_info(client, customer_id,
+                                            user_list_resource_name)
+    except REQUEST_ERRORS as ex:
+      failed_lists.add(list_name)
+      print_google_ads_exception(ex)
 
-  user_list_resource_name = get_user_list_resource_name(client, customer_id,
-                                                        list_name)
+  for list_name in failed_lists:
+    list_cache.pop(f'{customer_id}/{list_name}', None)
 
-  if not user_list_resource_name:
-    # Create missing user list
-    user_list_resource_name = create_user_list(client, customer_id, list_name,
-                                               list_type, app_id)
 
-  print(f'Uploading data for list \'{list_name}\'')
-  add_users_to_customer_match_user_list(client, customer_id,
-                                        user_list_resource_name, customer_data,
-                                        skip_polling)
+def print_google_ads_exception(ex):
+  """Prints the details of a failed Google Ads API request.
+
+  Args:
+    ex: The exception raised by the request, one of REQUEST_ERRORS.
+  """
+  if not isinstance(ex, GoogleAdsException):
+    print(f'Request failed: {ex!r}')
+    return
+  print(f'Request with ID "{ex.request_id}" failed with status '
+        f'"{ex.error.code().name}" and includes the following errors:')
+  for single_error in ex.failure.errors:
+    print(f'\tError with message "{single_error.message}".')
+    if single_error.location:
+      for field_path_element in single_error.location.field_path_elements:
+        print(f'\t\tOn field: {field_path_element.field_name}')
+
+
+def hash_many(values):
+  """Normalizes (lowercase, remove whitespace) and hashes strings with SHA-256.
+
+  The normalization is a pipeline of map() calls over the unbound str methods,
+  so the per-value steps run from C, and the hash constructor is looked up
+  once.
+
+  Args:
+    values: The strings to perform this operation on.
+
+  Returns:
+    A list with the normalized and SHA-256 hashed strings, in the same order.
+  """
+  sha256 = hashlib.sha256
+  # Repeated values (common in customer exports) are only hashed once.
+  unique_values = list(set(values))
+  normalized = map(str.encode, map(str.lower, map(str.strip, unique_values)))
+  hashes = dict(
+      zip(unique_values, [sha256(value).hexdigest() for value in normalized]))
+  return list(map(hashes.__getitem__, values))
 
 
-def normalize_and_sha256(s):
-  """Normalizes (lowercase, remove whitespace) and hashes a string with SHA-256.
+def positive_int(value):
+  """Parses a positive integer command line argument.
 
   Args:
-    s: The string to perform this operation on.
+    value: The argument value.
 
   Returns:
-    A normalized and SHA-256 hashed string.
+    The integer.
+
+  Raises:
+    argparse.ArgumentTypeError: If the value isn't a positive integer.
   """
-  return hashlib.sha256(s.strip().lower().encode()).hexdigest()
+  try:
+    number = int(value)
+  except ValueError:
+    number = 0
+  if number < 1:
+    raise argparse.ArgumentTypeError(f'{value!r} is not a positive integer.')
+  return number
 
 
 if __name__ == '__main__':
@@ -526,29 +1273,27 @@ if __name__ == '__main__':
       '--wait',
       action='store_true',
       default=False,
-      help='Wait for the jobs to finish (each job will be blocking).')
+      help='Wait for the jobs to finish (all the jobs are started first, '
+      'then waited on together).')
+  parser.add_argument(
+      '--max_workers',
+      type=positive_int,
+      default=MAX_UPLOAD_WORKERS,
+      help=('Maximum number of concurrent upload requests. Default value: '
+            f'{MAX_UPLOAD_WORKERS}'))
+  parser.add_argument(
+      '--list_cache_file',
+      default=LIST_CACHE_PATH,
+      help=('File where the user list resource names are cached between '
+            'runs. Pass an empty value to disable the cache.'))
   args = parser.parse_args()
 
-  data = read_csv(args.audience_file, args.list_type, args.hash_required)
-
   google_ads_client = GoogleAdsClient.load_from_storage(args.config_file)
 
-  for name in data:
-    print(f'Processing data for list \'{name}\'.')
-    try:
-      if not is_list_empty(data[name]):
-        upload_data(google_ads_client, args.customer_id, name, args.list_type,
-                    data[name], not args.wait, args.app_id)
-      else:
-        print(f'The list \'{name}\' will be skipped as no compatible data '
-              'has been found.')
-    except GoogleAdsException as ex:
-      print(f'Request with ID "{ex.request_id}" failed with status '
-            f'"{ex.error.code().name}" and includes the following errors:')
-      for single_error in ex.failure.errors:
-        print(f'\tError with message "{single_error.message}".')
-        if single_error.location:
-          for field_path_element in single_error.location.field_path_elements:
-            print(f'\t\tOn field: {field_path_element.field_name}')
+  list_cache = load_list_cache(args.list_cache_file)
+  data = read_csv(args.audience_file, args.list_type, args.hash_required)
+  upload_data(google_ads_client, args.customer_id, args.list_type, data,
+              not args.wait, args.app_id, args.max_workers, list_cache)
+  save_list_cache(args.list_cache_file, list_cache)
 
   print('The process has finished.')
@@ -0,0 +1,592 @@
+#!/usr/bin/env python
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for create_and_populate_list."""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.errors import GoogleAdsException
+
+import create_and_populate_list
+
+CUSTOMER_ID = '1234567890'
+USER_LIST_RESOURCE_NAME = 'customers/1234567890/userLists/1'
+
+
+def make_client(use_proto_plus, **services):
+  """Makes an offline Google Ads client returning the given services."""
+  client = GoogleAdsClient(
+      credentials=None, developer_token='', use_proto_plus=use_proto_plus)
+  client.get_service = services.__getitem__
+  return client
+
+
+def make_exception(client, message='Something failed.', **error_code):
+  """Makes the GoogleAdsException of a failed request.
+
+  Args:
+    client: The Google Ads client.
+    message: The error message.
+    **error_code: The error code, e.g. database_error='CONCURRENT_MODIFICATION'.
+
+  Returns:
+    The GoogleAdsException.
+  """
+  failure = client.get_type('GoogleAdsFailure')
+  error = create_and_populate_list._protobuf(failure).errors.add()
+  error.message = message
+  for kind, name in error_code.items():
+    enum_name = ''.join(word.capitalize() for word in kind.split('_'))
+    setattr(error.error_code, kind,
+            getattr(getattr(client.get_type(f'{enum_name}Enum'), enum_name),
+                    name))
+  error = mock.Mock()
+  error.code.return_value.name = 'INVALID_ARGUMENT'
+  return GoogleAdsException(error, None, failure, 'request-id')
+
+
+def make_failure_detail(client, index=None, message='Something failed.'):
+  """Makes a serialized GoogleAdsFailure detail, as in a response status."""
+  failure = create_and_populate_list._protobuf(
+      client.get_type('GoogleAdsFailure'))
+  error = failure.errors.add()
+  error.message = message
+  if index is not None:
+    field_path_element = error.location.field_path_elements.add()
+    field_path_element.field_name = 'operations'
+    field_path_element.index = index
+  return failure.SerializeToString()
+
+
+def search_results(client, user_list_resource_names):
+  """Makes the GoogleAdsService.Search results of a user list query."""
+  rows = []
+  for user_list_resource_name in user_list_resource_names:
+    row = client.get_type('GoogleAdsRow')
+    row.user_list.resource_name = user_list_resource_name
+    rows.append(row)
+  return rows
+
+
+class ClientTestCase(unittest.TestCase):
+  """Runs each test with fresh service clients and without printing."""
+
+  def setUp(self):
+    super().setUp()
+    create_and_populate_list.get_service.cache_clear()
+    self.addCleanup(create_and_populate_list.get_service.cache_clear)
+    stdout_patcher = mock.patch('sys.stdout', new_callable=io.StringIO)
+    self.stdout = stdout_patcher.start()
+    self.addCleanup(stdout_patcher.stop)
+
+
+class HashManyTest(unittest.TestCase):
+
+  def test_normalizes_and_hashes(self):
+    self.assertEqual(
+        create_and_populate_list.hash_many([' A@X.com ']),
+        [hashlib.sha256(b'a@x.com').hexdigest()])
+
+  def test_repeated_values_map_back_in_order(self):
+    a = hashlib.sha256(b'a@x.com').hexdigest()
+    b = hashlib.sha256(b'b@x.com').hexdigest()
+    self.assertEqual(
+        create_and_populate_list.hash_many(
+            ['a@x.com', 'B@x.com', ' a@x.com', 'a@x.com', 'b@x.com']),
+        [a, b, a, a, b])
+
+
+class RemoveDuplicatesTest(unittest.TestCase):
+
+  def test_removes_identifiers_seen_in_the_list(self):
+    seen = {}
+    first = create_and_populate_list.remove_duplicates(
+        {'emails': ['a', 'b', 'a'], 'phones': []}, seen)
+    second = create_and_populate_list.remove_duplicates(
+        {'emails': ['b', 'c'], 'phones': ['a']}, seen)
+    self.assertEqual(first, {'emails': ['a', 'b'], 'phones': []})
+    self.assertEqual(second, {'emails': ['c'], 'phones': ['a']})
+
+  def test_removes_repeated_addresses(self):
+    columns = create_and_populate_list.remove_duplicates(
+        {
+            'first_names': ['f', 'f', 'g'],
+            'last_names': ['l', 'l', 'l'],
+            'country_codes': ['US', 'US', 'US'],
+            'zip_codes': ['1', '1', '1'],
+        }, {})
+    self.assertEqual(columns['first_names'], ['f', 'g'])
+    self.assertEqual(columns['zip_codes'], ['1', '1'])
+
+  def test_keeps_addresses_with_the_same_concatenation(self):
+    columns = create_and_populate_list.remove_duplicates(
+        {
+            'first_names': ['ab', 'a'],
+            'last_names': ['c', 'bc'],
+            'country_codes': ['US', 'US'],
+            'zip_codes': ['1', '1'],
+        }, {})
+    self.assertEqual(columns['first_names'], ['ab', 'a'])
+
+
+class EscapeQueryStringTest(unittest.TestCase):
+
+  def test_escapes_quotes_and_backslashes(self):
+    self.assertEqual(
+        create_and_populate_list.escape_query_string("John's \\ List"),
+        "John\\'s \\\\ List")
+
+
+class IterCsvBatchesTest(unittest.TestCase):
+
+  def read_batches(self, content, list_type):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'audience.csv')
+      with open(path, mode='w', newline='') as csv_file:
+        csv_file.write(content)
+      with contextlib.redirect_stdout(io.StringIO()):
+        return list(create_and_populate_list.iter_csv_batches(path, list_type))
+
+  def test_pads_short_rows(self):
+    batches = self.read_batches('UserId,List\n1\n2,L\n', 'CRM_ID')
+    self.assertEqual(batches, [
+        (create_and_populate_list.GENERIC_LIST, {'user_ids': ['1']}),
+        ('L', {'user_ids': ['2']}),
+    ])
+
+  def test_ignores_cells_past_the_header(self):
+    batches = self.read_batches('UserId\n1,extra\n', 'CRM_ID')
+    self.assertEqual(batches, [
+        (create_and_populate_list.GENERIC_LIST, {'user_ids': ['1']}),
+    ])
+
+  def test_ignores_cells_past_the_header_with_all_columns(self):
+    batches = self.read_batches('UserId,List\n1,L,extra\n2\n', 'CRM_ID')
+    self.assertEqual(batches, [
+        ('L', {'user_ids': ['1']}),
+        (create_and_populate_list.GENERIC_LIST, {'user_ids': ['2']}),
+    ])
+
+  def test_missing_columns_are_empty_in_long_rows(self):
+    batches = self.read_batches('Email,Phone\na@x.com,1,Bob,Smith,US,12345\n',
+                                'CONTACT_INFO')
+    self.assertEqual(batches, [(create_and_populate_list.GENERIC_LIST, {
+        'emails': ['a@x.com'],
+        'phones': ['1'],
+        'first_names': [],
+        'last_names': [],
+        'country_codes': [],
+        'zip_codes': [],
+    })])
+
+  def test_yields_full_batches_per_list(self):
+    with mock.patch.object(create_and_populate_list, 'OPERATIONS_PER_REQUEST',
+                           2):
+      batches = self.read_batches('UserId,List\n1,A\n2,B\n3,A\n4,A\n',
+                                  'CRM_ID')
+    self.assertEqual(batches, [
+        ('A', {'user_ids': ['1', '3']}),
+        ('A', {'user_ids': ['4']}),
+        ('B', {'user_ids': ['2']}),
+    ])
+
+
+class LoadListCacheTest(unittest.TestCase):
+
+  def load(self, content):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'list_ids.json')
+      with open(path, mode='w') as cache_file:
+        cache_file.write(content)
+      return create_and_populate_list.load_list_cache(path)
+
+  def test_drops_expired_and_malformed_entries(self):
+    entry = {'resource_name': 'customers/1/userLists/2', 'updated': time.time()}
+    list_cache = self.load(
+        json.dumps({
+            '1/valid': entry,
+            '1/expired': dict(entry, updated=0),
+            '1/malformed': 'customers/1/userLists/3',
+        }))
+    self.assertEqual(list_cache, {'1/valid': entry})
+
+  def test_ignores_a_malformed_file(self):
+    self.assertEqual(self.load('[1, 2]'), {})
+    self.assertEqual(self.load('not json'), {})
+
+
+class GetEnumNameTest(unittest.TestCase):
+
+  def test_works_with_and_without_proto_plus(self):
+    for use_proto_plus in (True, False):
+      client = GoogleAdsClient(
+          credentials=None, developer_token='', use_proto_plus=use_proto_plus)
+      job = client.get_type('OfflineUserDataJob')
+      job.status = client.enums.OfflineUserDataJobStatusEnum.RUNNING
+      self.assertEqual(
+          create_and_populate_list.get_enum_name(
+              client, 'OfflineUserDataJobStatus', job.status), 'RUNNING')
+
+
+class GetOrCreateUserListTest(ClientTestCase):
+
+  def get_or_create(self, use_proto_plus, create_error=None, found=(),
+                    list_cache=None):
+    user_list_service = mock.Mock()
+    if create_error:
+      user_list_service.mutate_user_lists.side_effect = create_error
+    else:
+      user_list_service.mutate_user_lists.return_value = mock.Mock(
+          results=[mock.Mock(resource_name=USER_LIST_RESOURCE_NAME)])
+    google_ads_service = mock.Mock()
+    client = make_client(
+        use_proto_plus,
+        UserListService=user_list_service,
+        GoogleAdsService=google_ads_service)
+    google_ads_service.search.return_value = search_results(client, found)
+    list_cache = {} if list_cache is None else list_cache
+    user_list_resource_name = create_and_populate_list.get_or_create_user_list(
+        client, CUSTOMER_ID, 'List', 'CONTACT_INFO', None, list_cache)
+    return (user_list_resource_name, user_list_service, google_ads_service,
+            list_cache)
+
+  def test_creates_a_new_list_with_a_single_request(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        user_list_resource_name, _, google_ads_service, list_cache = (
+            self.get_or_create(use_proto_plus))
+        self.assertEqual(user_list_resource_name, USER_LIST_RESOURCE_NAME)
+        google_ads_service.search.assert_not_called()
+        self.assertEqual(
+            list_cache[f'{CUSTOMER_ID}/List']['resource_name'],
+            USER_LIST_RESOURCE_NAME)
+
+  def test_looks_up_the_list_if_it_cant_be_created(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        client = make_client(use_proto_plus)
+        user_list_resource_name, _, google_ads_service, _ = (
+            self.get_or_create(
+                use_proto_plus,
+                create_error=make_exception(client, 'App ID not set.'),
+                found=[USER_LIST_RESOURCE_NAME]))
+        self.assertEqual(user_list_resource_name, USER_LIST_RESOURCE_NAME)
+        google_ads_service.search.assert_called_once()
+
+  def test_raises_if_the_list_cant_be_created_or_found(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        client = make_client(use_proto_plus)
+        with self.assertRaises(GoogleAdsException):
+          self.get_or_create(
+              use_proto_plus, create_error=make_exception(client))
+
+  def test_uses_the_cached_list_without_requests(self):
+    list_cache = {
+        f'{CUSTOMER_ID}/List': {
+            'resource_name': USER_LIST_RESOURCE_NAME,
+            'updated': time.time(),
+        }
+    }
+    user_list_resource_name, user_list_service, google_ads_service, _ = (
+        self.get_or_create(False, list_cache=list_cache))
+    self.assertEqual(user_list_resource_name, USER_LIST_RESOURCE_NAME)
+    user_list_service.mutate_user_lists.assert_not_called()
+    google_ads_service.search.assert_not_called()
+
+
+class UploadBatchTest(ClientTestCase):
+
+  def upload(self, use_proto_plus, *results):
+    service = mock.Mock()
+    service.add_offline_user_data_job_operations.side_effect = results
+    client = make_client(use_proto_plus)
+    with mock.patch.object(create_and_populate_list.time, 'sleep') as sleep:
+      response = create_and_populate_list.upload_batch(
+          client, service, 'customers/1/offlineUserDataJobs/2',
+          {'user_ids': ['1']})
+    return response, service.add_offline_user_data_job_operations, sleep
+
+  def test_retries_concurrent_modifications(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        client = make_client(use_proto_plus)
+        error = make_exception(
+            client, database_error='CONCURRENT_MODIFICATION')
+        response, add_operations, sleep = self.upload(use_proto_plus, error,
+                                                      error, 'response')
+        self.assertEqual(response, 'response')
+        self.assertEqual(add_operations.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+  def test_retries_unavailable_service(self):
+    response, add_operations, _ = self.upload(
+        False, create_and_populate_list.ServiceUnavailable('Unavailable.'),
+        'response')
+    self.assertEqual(response, 'response')
+    self.assertEqual(add_operations.call_count, 2)
+
+  def test_does_not_retry_other_errors(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        client = make_client(use_proto_plus)
+        error = make_exception(client, request_error='RESOURCE_NAME_MALFORMED')
+        with self.assertRaises(GoogleAdsException):
+          self.upload(use_proto_plus, error, 'response')
+
+  def test_gives_up_after_the_maximum_attempts(self):
+    client = make_client(False)
+    errors = [make_exception(client, quota_error='RESOURCE_EXHAUSTED')
+             ] * create_and_populate_list.UPLOAD_MAX_ATTEMPTS
+    with self.assertRaises(GoogleAdsException):
+      self.upload(False, *errors)
+
+
+class CreateUserListJobTest(ClientTestCase):
+
+  def test_resolves_a_removed_cached_list_again(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        new_user_list_resource_name = 'customers/1234567890/userLists/2'
+        user_list_service = mock.Mock()
+        user_list_service.mutate_user_lists.return_value = mock.Mock(
+            results=[mock.Mock(resource_name=new_user_list_resource_name)])
+        job_service = mock.Mock()
+        client = make_client(
+            use_proto_plus,
+            UserListService=user_list_service,
+            OfflineUserDataJobService=job_service)
+        job_resource_name = 'customers/1234567890/offlineUserDataJobs/3'
+        job_service.create_offline_user_data_job.side_effect = [
+            make_exception(client, 'The user list was removed.'),
+            mock.Mock(resource_name=job_resource_name),
+        ]
+        list_cache = {
+            f'{CUSTOMER_ID}/List': {
+                'resource_name': USER_LIST_RESOURCE_NAME,
+                'updated': time.time(),
+            }
+        }
+        create_and_populate_list.get_service.cache_clear()
+
+        self.assertEqual(
+            create_and_populate_list.create_user_list_job(
+                client, CUSTOMER_ID, 'List', 'CONTACT_INFO', None, list_cache),
+            (new_user_list_resource_name, job_resource_name))
+        self.assertEqual(list_cache[f'{CUSTOMER_ID}/List']['resource_name'],
+                         new_user_list_resource_name)
+
+  def test_raises_for_a_new_list(self):
+    user_list_service = mock.Mock()
+    user_list_service.mutate_user_lists.return_value = mock.Mock(
+        results=[mock.Mock(resource_name=USER_LIST_RESOURCE_NAME)])
+    job_service = mock.Mock()
+    client = make_client(
+        False,
+        UserListService=user_list_service,
+        OfflineUserDataJobService=job_service)
+    job_service.create_offline_user_data_job.side_effect = make_exception(
+        client)
+    with self.assertRaises(GoogleAdsException):
+      create_and_populate_list.create_user_list_job(client, CUSTOMER_ID,
+                                                    'List', 'CONTACT_INFO',
+                                                    None, {})
+    job_service.create_offline_user_data_job.assert_called_once()
+
+
+class UploadDataTest(ClientTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.user_list_service = mock.Mock()
+    self.user_list_service.mutate_user_lists.side_effect = (
+        lambda customer_id, operations: mock.Mock(results=[
+            mock.Mock(resource_name=f'customers/{customer_id}/userLists/'
+                      f'{operations[0].create.name}')
+        ]))
+    self.job_service = mock.Mock()
+    self.job_service.create_offline_user_data_job.side_effect = (
+        lambda customer_id, job: mock.Mock(
+            resource_name=(
+                job.customer_match_user_list_metadata.user_list + '/job')))
+    check_job_status = mock.patch.object(create_and_populate_list,
+                                         'check_job_status')
+    check_job_status.start()
+    self.addCleanup(check_job_status.stop)
+
+  def upload(self, use_proto_plus, batches, add_operations, list_cache=None):
+    client = make_client(
+        use_proto_plus,
+        UserListService=self.user_list_service,
+        OfflineUserDataJobService=self.job_service)
+    self.job_service.add_offline_user_data_job_operations.side_effect = (
+        lambda request: add_operations(client, request))
+    create_and_populate_list.upload_data(
+        client, CUSTOMER_ID, 'CRM_ID', batches, True, max_workers=1,
+        list_cache=list_cache)
+
+  def run_jobs(self):
+    return [
+        call.kwargs['resource_name']
+        for call in self.job_service.run_offline_user_data_job.call_args_list
+    ]
+
+  def test_reports_partial_failures_at_their_index_in_the_job(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+
+        def add_operations(client, request):
+          response = client.get_type('AddOfflineUserDataJobOperationsResponse')
+          user_identifier = create_and_populate_list._protobuf(
+              request).operations[0].create.user_identifiers[0]
+          if user_identifier.third_party_user_id == '3':
+            status = create_and_populate_list._protobuf(
+                response).partial_failure_error
+            status.code = 3
+            status.details.add().value = make_failure_detail(client, 0)
+          return response
+
+        self.upload(use_proto_plus, [
+            ('A', {'user_ids': ['1', '2']}),
+            ('A', {'user_ids': ['3']}),
+        ], add_operations)
+        self.assertIn('A partial failure at index 2 occurred.',
+                      self.stdout.getvalue())
+
+  def test_skips_the_failed_lists_and_evicts_them_from_the_cache(self):
+    for error in (make_exception(make_client(False)),
+                  create_and_populate_list.ServiceUnavailable('Unavailable.')):
+      with self.subTest(error=type(error).__name__):
+        self.job_service.reset_mock()
+        added = []
+
+        def add_operations(client, request, error=error):
+          del client  # Unused.
+          user_identifier = create_and_populate_list._protobuf(
+              request).operations[0].create.user_identifiers[0]
+          added.append(user_identifier.third_party_user_id)
+          if user_identifier.third_party_user_id == 'b1':
+            raise error
+          return mock.Mock(partial_failure_error=None, warning=None)
+
+        list_cache = {
+            f'{CUSTOMER_ID}/B': {
+                'resource_name': 'customers/1234567890/userLists/B',
+                'updated': time.time(),
+            }
+        }
+        with mock.patch.object(create_and_populate_list, 'UPLOAD_MAX_ATTEMPTS',
+                               1):
+          self.upload(False, [
+              ('A', {'user_ids': ['a1']}),
+              ('B', {'user_ids': ['b1']}),
+              ('B', {'user_ids': ['b2']}),
+              ('A', {'user_ids': ['a2']}),
+          ], add_operations, list_cache)
+
+        self.assertEqual(added, ['a1', 'b1', 'a2'])
+        self.assertEqual(self.run_jobs(),
+                         ['customers/1234567890/userLists/A/job'])
+        self.assertNotIn(f'{CUSTOMER_ID}/B', list_cache)
+        self.assertIn(f'{CUSTOMER_ID}/A', list_cache)
+
+
+class BuildOfflineUserDataJobOperationsTest(unittest.TestCase):
+
+  def test_builds_an_operation_per_identifier(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        client = make_client(use_proto_plus)
+        request = client.get_type('AddOfflineUserDataJobOperationsRequest')
+        create_and_populate_list.build_offline_user_data_job_operations(
+            request, {
+                'emails': ['e1', 'e2'],
+                'phones': ['p1'],
+                'first_names': ['f1'],
+                'last_names': ['l1'],
+                'country_codes': ['US'],
+                'zip_codes': ['12345'],
+            })
+
+        user_identifiers = [
+            operation.create.user_identifiers[0]
+            for operation in create_and_populate_list._protobuf(
+                request).operations
+        ]
+        self.assertEqual(
+            [user_identifier.hashed_email
+             for user_identifier in user_identifiers[:2]], ['e1', 'e2'])
+        self.assertEqual(user_identifiers[2].hashed_phone_number, 'p1')
+        address_info = user_identifiers[3].address_info
+        self.assertEqual(
+            (address_info.hashed_first_name, address_info.hashed_last_name,
+             address_info.country_code, address_info.postal_code),
+            ('f1', 'l1', 'US', '12345'))
+        self.assertEqual(len(user_identifiers), 4)
+
+
+class PrintFailureDetailsTest(unittest.TestCase):
+
+  def print_details(self, use_proto_plus, *details):
+    client = make_client(use_proto_plus)
+    status = mock.Mock(details=[mock.Mock(value=value) for value in details])
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+      create_and_populate_list.print_failure_details(client, status, 100,
+                                                     'warning')
+    return stdout.getvalue()
+
+  def test_prints_the_errors_with_and_without_proto_plus(self):
+    for use_proto_plus in (True, False):
+      with self.subTest(use_proto_plus=use_proto_plus):
+        client = make_client(use_proto_plus)
+        output = self.print_details(
+            use_proto_plus, make_failure_detail(client, 3, 'With location.'),
+            make_failure_detail(client, message='Without location.'))
+        self.assertIn('A warning at index 103 occurred.\n'
+                      'Error message: With location.', output)
+        self.assertIn('A warning occurred.\nError message: Without location.',
+                      output)
+
+  def test_skips_details_that_cant_be_decoded(self):
+    client = make_client(False)
+    output = self.print_details(False, b'\xff\xff\xff',
+                                make_failure_detail(client, 0))
+    self.assertIn('A warning could not be decoded', output)
+    self.assertIn('A warning at index 100 occurred.', output)
+
+
+class PositiveIntTest(unittest.TestCase):
+
+  def test_parses_positive_integers(self):
+    self.assertEqual(create_and_populate_list.positive_int('4'), 4)
+
+  def test_rejects_other_values(self):
+    for value in ('0', '-1', 'four'):
+      with self.subTest(value=value):
+        with self.assertRaises(argparse.ArgumentTypeError):
+          create_and_populate_list.positive_int(value)
+
+
+if __name__ == '__main__':
+  unittest.main()